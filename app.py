@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import timedelta
 import re
+import hashlib
+import json
+import logging
 from io import BytesIO
 from pathlib import Path
 
@@ -17,8 +21,7 @@ st.set_page_config(
 # -------------------------------
 # Custom CSS
 # -------------------------------
-st.markdown(
-    """
+CSS = """
     <style>
     .shift-card {
         background-color:#F8F9F9;
@@ -47,9 +50,16 @@ st.markdown(
     .shift-lw { color: #7F8C8D; }      /* Gray */
     .shift-off { color: #C0392B; }     /* Red */
     </style>
-    """,
-    unsafe_allow_html=True
-)
+    """
+
+@st.cache_resource
+def compact_css(css: str):
+    css = re.sub(r"/\*.*?\*/|\s+", " ", css)
+    return re.sub(r"\s*([{};:])\s*", r"\1", css).strip()
+
+# Streamlit drops elements a rerun doesn't re-emit, so the <style> block has to
+# be sent every run; send a compacted copy to keep that payload small.
+st.markdown(compact_css(CSS), unsafe_allow_html=True)
 
 # -------------------------------
 # Shift Icons + Names + Colors
@@ -64,81 +74,193 @@ SHIFT_DETAILS = {
     "Leave": {"icon": "🛑", "label": "Off / Leave", "class": "shift-off"}
 }
 
+# Rendered assignment labels, formatted once instead of per lookup
+LABEL_HTML = {
+    col: f"<div class='shift-text {d['class']}'>{d['icon']} "
+         + (d["label"] if col in ["Off", "Leave"] else f"{col} ({d['label']})")
+         + "</div>"
+    for col, d in SHIFT_DETAILS.items()
+}
+NO_ASSIGNMENT_LABEL = "<div class='shift-text'>➖ No Assignment</div>"
+
 # -------------------------------
 # Helpers
 # -------------------------------
+# No numba @njit here: this is string/pandas work on a small roster, which
+# numba handles poorly (object mode) and would only add compile time.
 KNOWN_SHIFT_COLS = ["1st", "2nd", "3rd", "General", "LW/NI"]
 KNOWN_PEOPLE = ["VB", "RR", "ST", "SRB", "AH"]
+CACHE_DIR = Path(".cache")
+# Bump whenever parse_roster's output changes so stale parquet files are ignored
+ROSTER_CACHE_VERSION = 1
+_TOKEN_SPLIT_RE = re.compile(r"[^A-Za-z]+")
+# ASCII non-letters -> "/" (non-ASCII cells fall back to the regex)
+_TOKEN_SPLIT_TABLE = str.maketrans({chr(i): "/" for i in range(128) if not chr(i).isalpha()})
 
 def normalize_tokenize(cell):
-    if pd.isna(cell):
+    # Inline scalar missing-value check; pd.isna is much slower per cell
+    if cell is None or cell is pd.NA or cell is pd.NaT or (isinstance(cell, float) and cell != cell):
         return []
-    s = re.sub(r"[^A-Za-z]+", "/", str(cell))
+    s = str(cell)
+    if not s.isascii():
+        s = _TOKEN_SPLIT_RE.sub("/", s)
+    elif s.isalpha():
+        # Most cells hold a single set of initials, e.g. "VB"
+        return [s]
+    else:
+        s = s.translate(_TOKEN_SPLIT_TABLE)
     return [t for t in s.split("/") if t]
 
-@st.cache_data
-def load_roster_from_bytes(data: bytes):
-    df = pd.read_excel(BytesIO(data), sheet_name=None)
-    for name, sheet in df.items():
-        cols = [str(c).strip() for c in sheet.columns]
-        if any(c.upper().startswith("DATE") for c in cols):
-            sheet = sheet.copy()
+def find_roster_sheet(xl):
+    """(name, date column, parsed sheet or None) of the first sheet with a DATE column."""
+    # A lone sheet is parsed once in full; otherwise peek at header rows only
+    # so the other sheets are never fully parsed
+    single = len(xl.sheet_names) == 1
+    for name in xl.sheet_names:
+        frame = xl.parse(name) if single else xl.parse(name, nrows=0)
+        date_col = next((c for c in map(str.strip, map(str, frame.columns)) if c.upper().startswith("DATE")), None)
+        if date_col is not None:
+            return name, date_col, frame if single else None
+    return None, None, None
+
+def parse_roster(data: bytes):
+    try:
+        xl = pd.ExcelFile(BytesIO(data), engine="calamine")
+    except (ImportError, ValueError):
+        # python-calamine not installed (ImportError) or pandas < 2.2 without
+        # the calamine engine (ValueError), fall back to openpyxl
+        xl = pd.ExcelFile(BytesIO(data))
+    with xl:
+        name, date_col, sheet = find_roster_sheet(xl)
+        if name is not None:
+            if sheet is None:
+                sheet = xl.parse(name)
             sheet.columns = [str(c).strip() for c in sheet.columns]
-            date_col = next((c for c in sheet.columns if c.upper().startswith("DATE")), None)
-            sheet[date_col] = pd.to_datetime(sheet[date_col], errors="coerce")
-            sheet = sheet[pd.notna(sheet[date_col])]
+            # Excel date cells already come back as datetime64; only parse text dates
+            if not pd.api.types.is_datetime64_any_dtype(sheet[date_col]):
+                sheet[date_col] = pd.to_datetime(sheet[date_col], errors="coerce")
+            sheet = sheet[pd.notna(sheet[date_col])].reset_index(drop=True)
             return sheet, date_col
     raise ValueError("No valid DATE column found.")
 
-@st.cache_data
+def read_cached_roster(key: str):
+    parquet_path = CACHE_DIR / f"{key}.parquet"
+    meta_path = CACHE_DIR / f"{key}.json"
+    if not (parquet_path.exists() and meta_path.exists()):
+        return None, None
+    try:
+        sheet = pd.read_parquet(parquet_path)
+        date_col = json.loads(meta_path.read_text())["date_col"]
+    except Exception:
+        return None, None
+    return sheet, date_col
+
+def write_cached_roster(key: str, sheet, date_col):
+    # Object columns can mix types (a number typed into a text column), which
+    # pyarrow refuses; as strings they tokenize the same and NaN stays missing
+    sheet = sheet.astype({c: "string" for c in sheet.columns if sheet[c].dtype == object})
+    # Best effort: a missing parquet engine or read-only disk just means no cache
+    try:
+        CACHE_DIR.mkdir(exist_ok=True)
+        sheet.to_parquet(CACHE_DIR / f"{key}.parquet")
+        (CACHE_DIR / f"{key}.json").write_text(json.dumps({"date_col": date_col}))
+    except Exception:
+        logging.getLogger(__name__).warning("Could not cache roster %s", key, exc_info=True)
+
+def tokenize_categories(col):
+    """Token set per cell of categorical `col`, built from its categories."""
+    lookup = np.empty(len(col.cat.categories) + 1, dtype=object)
+    for i, value in enumerate(col.cat.categories):
+        lookup[i] = frozenset(normalize_tokenize(value))
+    lookup[-1] = frozenset()  # code -1 is a missing cell
+    return lookup[col.cat.codes.to_numpy()]
+
+# cache_resource hands every rerun and session the same frames instead of
+# unpickling a fresh copy per hit, so nothing downstream may mutate them.
+# Only the repo roster is persisted to disk; uploads would pile up in CACHE_DIR.
+@st.cache_resource
+def load_roster_from_bytes(data: bytes, persist: bool = False):
+    key = f"v{ROSTER_CACHE_VERSION}-{hashlib.sha1(data).hexdigest()}"
+    sheet, date_col = read_cached_roster(key) if persist else (None, None)
+    if sheet is None:
+        sheet, date_col = parse_roster(data)
+        # Keep only the columns the app reads
+        sheet = sheet[[date_col] + build_token_columns(sheet)]
+        if persist:
+            write_cached_roster(key, sheet, date_col)
+    # Index by date once so per-date lookups don't rescan the column; a stable
+    # sort keeps the first row in file order first for duplicate dates
+    sheet = sheet.set_index(date_col, drop=False).sort_index(kind="stable")
+    # Shift cells repeat a handful of values, so store them as categories and
+    # tokenize each distinct value once
+    token_cols = build_token_columns(sheet)
+    sheet = sheet.astype({c: "category" for c in token_cols})
+    tokens = pd.DataFrame({c: tokenize_categories(sheet[c]) for c in token_cols}, index=sheet.index)
+    return sheet, date_col, build_assignments(tokens, build_shift_columns(sheet))
+
+@st.cache_resource
 def load_roster_from_repo():
     candidates = list(Path(".").glob("*.xlsx")) + list(Path("data").glob("*.xlsx"))
     if not candidates:
-        return None, None, None
+        return None, None, None, None
     candidates.sort(key=lambda p: p.stat().st_mtime, reverse=True)
     path = candidates[0]
     with path.open("rb") as f:
         data = f.read()
-    sheet, date_col = load_roster_from_bytes(data)
-    return sheet, date_col, path.name
+    sheet, date_col, assignments = load_roster_from_bytes(data, persist=True)
+    return sheet, date_col, assignments, path.name
 
 def build_shift_columns(df):
     return [c for c in KNOWN_SHIFT_COLS if c in df.columns]
 
-def get_assignment_for_person(row, person, shift_cols):
-    for col in shift_cols:
-        tokens = normalize_tokenize(row.get(col, None))
-        if person in tokens:
-            d = SHIFT_DETAILS.get(col, {})
-            return f"<div class='shift-text {d.get('class','')}'>{d.get('icon','')} {col} ({d.get('label','')})</div>"
+def build_token_columns(df):
+    return build_shift_columns(df) + [c for c in ["Off", "Leave"] if c in df.columns]
+
+def date_bounds(df):
+    # The loader sorts by the date index, so the ends are the min/max
+    return df.index[0].date(), df.index[-1].date()
+
+def get_assignments_for_frame(tokens, person, shift_cols):
+    """Assignment label for `person` on every row of the token frame `tokens`."""
+    def hits(col):
+        return np.fromiter((person in t for t in tokens[col]), dtype=bool, count=len(tokens))
+
+    off = np.zeros(len(tokens), dtype=bool)
     for col in ["Off", "Leave"]:
-        if col in row:
-            tokens = normalize_tokenize(row[col])
-            if person in tokens:
-                d = SHIFT_DETAILS[col]
-                return f"<div class='shift-text {d['class']}'>{d['icon']} {d['label']}</div>"
-    return "<div class='shift-text'>➖ No Assignment</div>"
-
-def render_assignment_for_dates(df, date_col, person, base_date, shift_cols):
+        if col in tokens.columns:
+            off |= hits(col)
+    return np.select(
+        [hits(c) for c in shift_cols] + [off],
+        [LABEL_HTML[c] for c in shift_cols] + [LABEL_HTML["Off"]],
+        default=NO_ASSIGNMENT_LABEL
+    )
+
+def build_assignments(tokens, shift_cols):
+    """Assignment label per date (rows) and person (columns)."""
+    return pd.DataFrame(
+        {p: pd.Categorical(get_assignments_for_frame(tokens, p, shift_cols)) for p in KNOWN_PEOPLE},
+        index=tokens.index
+    )
+
+def render_assignment_for_dates(assignments, person, base_date):
     d1 = pd.to_datetime(base_date)
     d2 = d1 + timedelta(days=1)
-    rows_today = df[df[date_col] == d1]
-    rows_tom = df[df[date_col] == d2]
+    labels = assignments[person]
 
-    def label(rowset):
-        if rowset.empty:
+    def label(d):
+        if d not in labels.index:
             return "<div class='shift-text'>No data</div>"
-        return get_assignment_for_person(rowset.iloc[0], person, shift_cols)
+        return labels.loc[[d]].iat[0]
 
     return (
-        d1.strftime("%Y-%m-%d"), label(rows_today),
-        d2.strftime("%Y-%m-%d"), label(rows_tom)
+        d1.strftime("%Y-%m-%d"), label(d1),
+        d2.strftime("%Y-%m-%d"), label(d2)
     )
 
 # -------------------------------
 # Load Roster Data
 # -------------------------------
-df, date_col, filename = load_roster_from_repo()
+df, date_col, assignments, filename = load_roster_from_repo()
 uploaded = None
 
 # -------------------------------
@@ -154,13 +276,10 @@ page = st.sidebar.radio(
 # Shared Inputs (Person & Date)
 # -------------------------------
 if df is not None:
-    shift_cols = build_shift_columns(df)
-
     st.sidebar.markdown("### Filters")
     person = st.sidebar.selectbox("👤 Person", KNOWN_PEOPLE)
     today = pd.Timestamp.today().date()
-    date_min = pd.to_datetime(df[date_col].min()).date()
-    date_max = pd.to_datetime(df[date_col].max()).date()
+    date_min, date_max = date_bounds(df)
     default_date = today if date_min <= today <= date_max else date_min
     selected_date = st.sidebar.date_input("📆 Date", value=default_date, min_value=date_min, max_value=date_max)
 
@@ -172,7 +291,7 @@ if page == "📅 Today & Tomorrow":
     if df is None:
         st.info("No roster file found. Please upload one.")
     else:
-        d1, a1, d2, a2 = render_assignment_for_dates(df, date_col, person, selected_date, shift_cols)
+        d1, a1, d2, a2 = render_assignment_for_dates(assignments, person, selected_date)
 
         colA, colB = st.columns(2)
         with colA:
@@ -191,13 +310,11 @@ elif page == "📊 Weekly View":
         sel = pd.to_datetime(selected_date)
         monday = (sel - pd.Timedelta(days=sel.weekday())).normalize()
         sunday = monday + pd.Timedelta(days=6)
-        mask = (df[date_col] >= monday) & (df[date_col] <= sunday)
-        week = df.loc[mask, [date_col] + shift_cols + [c for c in ["Off","Leave"] if c in df.columns]].copy()
-        week["Assignment"] = week.apply(lambda r: get_assignment_for_person(r, person, shift_cols), axis=1)
-        week = week[[date_col, "Assignment"]].rename(columns={date_col: "Date"}).sort_values("Date")
+        # Sorted date index: label slicing is a binary search, not a full-column mask
+        week = assignments[person].loc[monday:sunday]
         # Render with colored HTML
-        for _, row in week.iterrows():
-            st.markdown(f"<div class='shift-card'><div class='shift-date'>{row['Date'].strftime('%Y-%m-%d')}</div>{row['Assignment']}</div>", unsafe_allow_html=True)
+        for date, assignment in week.items():
+            st.markdown(f"<div class='shift-card'><div class='shift-date'>{date.strftime('%Y-%m-%d')}</div>{assignment}</div>", unsafe_allow_html=True)
 
 # -------------------------------
 # Page: Upload Roster
@@ -207,6 +324,6 @@ elif page == "📂 Upload Roster":
     st.write("Upload a new Excel file to update the roster.")
     uploaded = st.file_uploader("Upload Excel (.xlsx)", type=["xlsx"])
     if uploaded:
-        df, date_col = load_roster_from_bytes(uploaded.read())
+        df, date_col, assignments = load_roster_from_bytes(uploaded.read())
         filename = uploaded.name
         st.success(f"Loaded new roster: {filename}")